@@ -4,77 +4,252 @@ Contract:
 
 def generate_both(profile: dict, jd_url: str) -> dict:
     Returns a dict with keys: pdf (bytes), docx (bytes), filenames{pdf, docx}, coverage.
+
+def resume_filenames(profile: dict, jd_url: str) -> dict:
+    Returns the {pdf, docx} filenames generate_both() would produce today.
+
+ENGINE_ID: str
+    Identifies the engine version and selected backends. Callers that cache
+    output key it on this, so bump ENGINE_VERSION whenever the output changes.
+
+PDFs are written with fpdf2 (no HTML/CSS layout) when the text fits its core
+fonts (cp1252); other text, or RESUME_PDF_BACKEND=weasyprint, renders through
+WeasyPrint.
+
+DOCX files are assembled directly as a minimal OOXML zip. Set
+RESUME_DOCX_BACKEND=python-docx to build them from python-docx's default template.
 """
 
 from __future__ import annotations
 
-from datetime import datetime
+import html
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from io import BytesIO
 from urllib.parse import urlparse
+from xml.sax.saxutils import escape as xml_escape
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from fpdf import FPDF
+
+PDF_BACKEND = os.getenv("RESUME_PDF_BACKEND", "fpdf")
+DOCX_BACKEND = os.getenv("RESUME_DOCX_BACKEND", "ooxml")
+
+ENGINE_VERSION = "1"
+ENGINE_ID = f"stub-{ENGINE_VERSION}/{PDF_BACKEND}/{DOCX_BACKEND}"
+
+# WeasyPrint (Cairo/Pango) and python-docx are imported on first use, so
+# importing this module stays cheap when the default backends are in use.
+_HTML = None
+_FC = None
+_CSS = None
+_Document = None
+
+_CSS_SOURCE = (
+    "body { font-family: -apple-system, Segoe UI, Roboto, sans-serif; font-size: 12pt; }"
+    " pre { white-space: pre-wrap; }"
+)
+# Styling comes from _CSS; the stub text is html-escaped into the <pre> block
+_HTML_TMPL = "<html><head><meta charset='utf-8'></head><body><pre>{}</pre></body></html>"
+
+# Stub resume layout; optional sections render as empty strings
+_TEXT_TMPL = (
+    "{header}\n"
+    "{summary}"
+    "(Stub) Tailored for: {url}\n"
+    "\n"
+    "Experience\n"
+    "• Contributed to team projects with clear communication and documentation.\n"
+    "• Applied standard problem-solving and data handling techniques where appropriate."
+)
+
+# Minimal WordprocessingML package: content types, root rels, one document part
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    "</Types>"
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships/officeDocument" Target="word/document.xml"/>'
+    "</Relationships>"
+)
+_DOCX_DOCUMENT_TMPL = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    "<w:body>{paragraphs}<w:sectPr/></w:body>"
+    "</w:document>"
+)
+
+
+@dataclass(frozen=True, slots=True)
+class NormalizedProfile:
+    """Profile fields stripped once up front; hashable, so it can key caches."""
+
+    full_name: str
+    city: str
+    email: str
+    phone: str
+    linkedin: str
+    github: str
+    about: str
+
+    @classmethod
+    def from_dict(cls, profile: dict) -> NormalizedProfile:
+        return cls(**{f.name: (profile.get(f.name) or "").strip() for f in fields(cls)})
 
-from weasyprint import HTML
-from docx import Document
-
-
-def _build_text(profile: dict, jd_url: str) -> str:
-    name = (profile.get("full_name") or "").strip()
-    lines = []
-    if name:
-        lines.append(name)
-    contact = []
-    for key in ("city", "email", "phone", "linkedin", "github"):
-        val = (profile.get(key) or "").strip()
-        if val:
-            contact.append(val)
-    if contact:
-        lines.append(" | ".join(contact))
-    lines.append("")
-    about = (profile.get("about") or "").strip()
-    if about:
-        lines.append("Summary")
-        lines.append(about)
-        lines.append("")
-    lines.append(f"(Stub) Tailored for: {jd_url}")
-    lines.append("")
-    lines.append("Experience")
-    lines.append("• Contributed to team projects with clear communication and documentation.")
-    lines.append("• Applied standard problem-solving and data handling techniques where appropriate.")
-    return "\n".join(lines)
+    @property
+    def contact(self) -> tuple[str, ...]:
+        return (self.city, self.email, self.phone, self.linkedin, self.github)
+
+
+@lru_cache(maxsize=256)
+def _build_text(profile: NormalizedProfile, jd_url: str) -> str:
+    # Cached on the normalized fields, so re-tailoring the same profile is a lookup
+    contact = " | ".join(v for v in profile.contact if v)
+    return _TEXT_TMPL.format(
+        header="".join(f"{line}\n" for line in (profile.full_name, contact) if line),
+        summary=f"Summary\n{profile.about}\n\n" if profile.about else "",
+        url=jd_url,
+    )
 
 
 def _to_pdf_bytes(text: str) -> bytes:
-    html = f"""
-    <html>
-      <head>
-        <meta charset='utf-8'>
-        <style>
-          body {{ font-family: -apple-system, Segoe UI, Roboto, sans-serif; font-size: 12pt; }}
-          pre {{ white-space: pre-wrap; }}
-        </style>
-      </head>
-      <body>
-        <pre>{text}</pre>
-      </body>
-    </html>
-    """
-    return HTML(string=html).write_pdf()
+    if PDF_BACKEND == "weasyprint":
+        return _to_pdf_bytes_weasyprint(text)
+    try:
+        text.encode("cp1252")
+    except UnicodeEncodeError:
+        # fpdf2's core fonts only cover cp1252; let WeasyPrint shape anything else
+        return _to_pdf_bytes_weasyprint(text)
+    pdf = FPDF()
+    # cp1252 rather than latin-1 so the "•" bullet renders
+    pdf.core_fonts_encoding = "windows-1252"
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=12)
+    for line in text.splitlines():
+        pdf.multi_cell(0, 6, line, new_x="LMARGIN", new_y="NEXT")
+    return bytes(pdf.output())
+
+
+def _load_weasyprint() -> None:
+    global _HTML, _FC, _CSS
+    if _HTML is None:
+        from weasyprint import CSS, HTML
+        from weasyprint.text.fonts import FontConfiguration
+
+        # Built once per process: avoids a fontconfig rescan and CSS parse per render
+        _FC = FontConfiguration()
+        _CSS = CSS(string=_CSS_SOURCE, font_config=_FC)
+        _HTML = HTML
+
+
+@lru_cache(maxsize=16)
+def _render_doc(text: str):
+    """Lay out text with WeasyPrint once; the returned Document can be written many times."""
+    _load_weasyprint()
+    html_doc = _HTML(string=_HTML_TMPL.format(html.escape(text)))
+    return html_doc.render(stylesheets=[_CSS], font_config=_FC)
+
+
+def _doc_to_pdf(doc, **opts) -> bytes:
+    # Layout is already done; variants (e.g. zoom=) only pay for PDF serialization
+    return doc.write_pdf(**opts)
+
+
+def _to_pdf_bytes_weasyprint(text: str) -> bytes:
+    return _doc_to_pdf(_render_doc(text))
+
+
+# Characters outside the XML 1.0 Char production; Word refuses files containing them
+_XML_INVALID_RE = re.compile("[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+# Only real newlines start a paragraph (str.splitlines() also splits on \v, \f, ...)
+_NEWLINE_RE = re.compile(r"\r\n|\r|\n")
+# Vertical tab / form feed become line breaks within the paragraph, as Word does
+_SOFT_BREAK_RE = re.compile(r"[\v\f]")
+
+
+def _docx_lines(text: str) -> list[str]:
+    lines = _NEWLINE_RE.split(text)
+    # Like splitlines(), a trailing newline doesn't add an empty paragraph
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def _docx_run(line: str) -> str:
+    parts = [
+        f'<w:t xml:space="preserve">{xml_escape(_XML_INVALID_RE.sub("", part))}</w:t>'
+        for part in _SOFT_BREAK_RE.split(line)
+    ]
+    return f"<w:r>{'<w:br/>'.join(parts)}</w:r>"
 
 
 def _to_docx_bytes(text: str) -> bytes:
-    doc = Document()
-    for line in text.splitlines():
+    if DOCX_BACKEND == "python-docx":
+        return _to_docx_bytes_python_docx(text)
+    paragraphs = []
+    for line in _docx_lines(text):
+        if line.startswith("• "):
+            # Keeping bullets simple in stub; no fabricated claims
+            line = line[2:].strip()
+        if line:
+            paragraphs.append(f"<w:p>{_docx_run(line)}</w:p>")
+        else:
+            paragraphs.append("<w:p/>")
+    buf = BytesIO()
+    with ZipFile(buf, "w", ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        z.writestr("_rels/.rels", _DOCX_RELS)
+        z.writestr("word/document.xml", _DOCX_DOCUMENT_TMPL.format(paragraphs="".join(paragraphs)))
+    return buf.getvalue()
+
+
+def _to_docx_bytes_python_docx(text: str) -> bytes:
+    global _Document
+    if _Document is None:
+        from docx import Document as _Document
+    doc = _Document()
+    for line in _docx_lines(text):
+        # python-docx turns "\n" inside a run into <w:br/> but rejects control characters
+        line = _XML_INVALID_RE.sub("", _SOFT_BREAK_RE.sub("\n", line))
         if line.startswith("• "):
             p = doc.add_paragraph()
             run = p.add_run(line[2:].strip())
             # Keeping bullets simple in stub; no fabricated claims
         else:
             doc.add_paragraph(line)
-    from io import BytesIO
-
     buf = BytesIO()
     doc.save(buf)
     return buf.getvalue()
 
 
+def _filenames(prof: NormalizedProfile, jd_url: str) -> dict:
+    name = prof.full_name or "Resume"
+    name_safe = "_".join(name.split())
+    host = urlparse(jd_url).hostname or "job"
+    today = time.strftime("%Y%m%d", time.gmtime())
+    return {
+        "pdf": f"Resume_{name_safe}_{host}_{today}.pdf",
+        "docx": f"Resume_{name_safe}_{host}_{today}.docx",
+    }
+
+
+def resume_filenames(profile: dict, jd_url: str) -> dict:
+    """Filenames generate_both() would return today, without rendering anything."""
+    return _filenames(NormalizedProfile.from_dict(profile), jd_url)
+
+
 def generate_both(profile: dict, jd_url: str) -> dict:
     """Generate stub resume PDF and DOCX bytes with filenames and coverage.
 
@@ -89,18 +264,15 @@ def generate_both(profile: dict, jd_url: str) -> dict:
         "coverage": {"score": 0.8, "hits": ["sql"], "misses": ["dbt"]}
       }
     """
-    text = _build_text(profile, jd_url)
-    pdf_bytes = _to_pdf_bytes(text)
-    docx_bytes = _to_docx_bytes(text)
+    prof = NormalizedProfile.from_dict(profile)
+    text = _build_text(prof, jd_url)
+    # The two exports share no state; overlap them so wall time is max(), not sum()
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_pdf = ex.submit(_to_pdf_bytes, text)
+        f_docx = ex.submit(_to_docx_bytes, text)
+        pdf_bytes, docx_bytes = f_pdf.result(), f_docx.result()
 
-    name = (profile.get("full_name") or "").strip() or "Resume"
-    name_safe = "_".join(name.split())
-    host = urlparse(jd_url).hostname or "job"
-    today = datetime.utcnow().strftime("%Y%m%d")
-    filenames = {
-        "pdf": f"Resume_{name_safe}_{host}_{today}.pdf",
-        "docx": f"Resume_{name_safe}_{host}_{today}.docx",
-    }
+    filenames = _filenames(prof, jd_url)
 
     coverage = {"score": 0.8, "hits": ["sql"], "misses": ["dbt"]}
 
@@ -6,16 +6,20 @@ management, stubbed resume generation (PDF/DOCX), and downloads.
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
-import tempfile
+import secrets
+import shutil
 from datetime import datetime, timedelta, timezone
+from io import BytesIO
 from urllib.parse import urlparse
 
 from flask import (
     Flask,
     abort,
     flash,
+    g,
     redirect,
     render_template,
     request,
@@ -30,45 +34,185 @@ from flask_login import (
     logout_user,
 )
 from flask_wtf import FlaskForm
+from sqlalchemy import (
+    Column,
+    ForeignKeyConstraint,
+    Integer,
+    LargeBinary,
+    MetaData,
+    Table,
+    and_,
+    delete,
+    exists,
+    inspect,
+    or_,
+    select,
+    text,
+)
+from sqlalchemy.schema import AddConstraint, DropConstraint
+from sqlalchemy.orm import joinedload
 from wtforms import HiddenField, StringField, TextAreaField
 from wtforms.validators import DataRequired, Email, Length, URL as UrlValidator
 
 from db import SessionLocal, init_db, engine
-from models import Base, GeneratedResume, Profile, User
-from adapters.resume_engine import generate_both
-
+from models import Base, GeneratedResume, Profile, ResumeBlob, User
+from tasks import RENDER_TIMEOUT, enqueue, is_stale, mark_failed
+from adapters.resume_engine import ENGINE_ID, resume_filenames
+
+
+# Optional profile columns; resolved once per process by _ensure_schema()
+HAS_PROFILE_ABOUT = False
+HAS_PROFILE_GEMINI = False
+_SCHEMA_READY = False
+
+
+def _rebuild_with_cascade(conn, table) -> None:
+    """Recreate a SQLite table from the model so its FKs match (ON DELETE CASCADE).
+
+    Rows are copied over and the model's indexes recreated. Runs inside an
+    explicit BEGIN, since pysqlite would otherwise autocommit each DDL statement.
+    """
+    conn.exec_driver_sql("BEGIN")
+    cols = [c["name"] for c in inspect(conn).get_columns(table.name) if c["name"] in table.c]
+    for ix in inspect(conn).get_indexes(table.name):
+        conn.exec_driver_sql(f'DROP INDEX "{ix["name"]}"')
+    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "_old_{table.name}"')
+    table.create(conn)
+    col_list = ", ".join(f'"{c}"' for c in cols)
+    conn.exec_driver_sql(
+        f'INSERT INTO "{table.name}" ({col_list}) SELECT {col_list} FROM "_old_{table.name}"'
+    )
+    conn.exec_driver_sql(f'DROP TABLE "_old_{table.name}"')
+
+
+def _replace_fk_with_cascade(conn, table, fk_names: list[str]) -> None:
+    """Swap a table's user_id FK for one with ON DELETE CASCADE (Postgres, MySQL, ...).
+
+    fk_names are the reflected names of the existing FKs to users.id; the new
+    constraint reuses the first one.
+    """
+    meta = MetaData()
+    Table("users", meta, Column("id", Integer, primary_key=True))
+    legacy = Table(table.name, meta, Column("user_id", Integer))
+    for name in fk_names:
+        old = ForeignKeyConstraint(["user_id"], ["users.id"], name=name)
+        legacy.append_constraint(old)
+        conn.execute(DropConstraint(old))
+    new = ForeignKeyConstraint(
+        ["user_id"], ["users.id"], name=fk_names[0] if fk_names else None, ondelete="CASCADE"
+    )
+    legacy.append_constraint(new)
+    conn.execute(AddConstraint(new))
+
+
+def _ensure_schema() -> None:
+    """Create tables and add columns missing from existing SQLite DBs.
+
+    Lightweight dev migration. Runs once per process, so repeated create_app()
+    calls (e.g. tests) skip the introspection.
+    """
+    global HAS_PROFILE_ABOUT, HAS_PROFILE_GEMINI, _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
 
-def create_app() -> Flask:
-    app = Flask(__name__)
-    app.secret_key = os.getenv("SECRET_KEY", "dev_key")
-
-    # Initialize DB
     init_db(Base)
 
-    # Ensure optional columns exist on existing SQLite DBs (lightweight dev migration)
-    from sqlalchemy import inspect, text
-
     try:
         inspector = inspect(engine)
         profile_cols = {c["name"] for c in inspector.get_columns("profiles")}
+        resume_cols = {c["name"] for c in inspector.get_columns("generated_resumes")}
+        resume_indexes = {i["name"] for i in inspector.get_indexes("generated_resumes")}
+        # Tables created before user_id got ON DELETE CASCADE, with their FKs to users
+        needs_cascade = []
+        for t in (Profile.__table__, GeneratedResume.__table__):
+            fks = [
+                fk for fk in inspector.get_foreign_keys(t.name) if fk["referred_table"] == "users"
+            ]
+            if not any((fk["options"].get("ondelete") or "").upper() == "CASCADE" for fk in fks):
+                # Postgres/MySQL always name FKs; only SQLite reports None here
+                needs_cascade.append((t, [fk["name"] for fk in fks if fk["name"]]))
     except Exception:
         profile_cols = set()
+        resume_cols = set()
+        resume_indexes = set()
+        needs_cascade = []
 
     to_add = []
+    added_profile_cols = set()
+    backfill_job_host = False
     if "about" not in profile_cols:
         to_add.append("ALTER TABLE profiles ADD COLUMN about TEXT")
+        added_profile_cols.add("about")
     if "gemini_api_key" not in profile_cols:
         to_add.append("ALTER TABLE profiles ADD COLUMN gemini_api_key VARCHAR(255)")
+        added_profile_cols.add("gemini_api_key")
+    if "status" not in resume_cols:
+        to_add.append(
+            "ALTER TABLE generated_resumes ADD COLUMN status VARCHAR(16) NOT NULL DEFAULT 'ready'"
+        )
+    # BLOB on SQLite/MySQL, BYTEA on Postgres
+    blob_type = LargeBinary().compile(dialect=engine.dialect)
+    if "pdf_blob" not in resume_cols:
+        to_add.append(f"ALTER TABLE generated_resumes ADD COLUMN pdf_blob {blob_type}")
+    if "docx_blob" not in resume_cols:
+        to_add.append(f"ALTER TABLE generated_resumes ADD COLUMN docx_blob {blob_type}")
+    if "content_hash" not in resume_cols:
+        to_add.append("ALTER TABLE generated_resumes ADD COLUMN content_hash VARCHAR(64)")
+        to_add.append(
+            "CREATE INDEX IF NOT EXISTS ix_genres_user_hash"
+            " ON generated_resumes (user_id, content_hash)"
+        )
+    if "job_host" not in resume_cols:
+        to_add.append("ALTER TABLE generated_resumes ADD COLUMN job_host VARCHAR(255)")
+        backfill_job_host = True
+    if "ix_genres_hash" not in resume_indexes:
+        to_add.append(
+            "CREATE INDEX IF NOT EXISTS ix_genres_hash ON generated_resumes (content_hash)"
+        )
+    if "ix_genres_user_created" not in resume_indexes:
+        to_add.append(
+            "CREATE INDEX IF NOT EXISTS ix_genres_user_created"
+            " ON generated_resumes (user_id, created_at)"
+        )
     if to_add:
         with engine.begin() as conn:
             for stmt in to_add:
                 conn.execute(text(stmt))
-        # Reinspect after altering
-        inspector = inspect(engine)
-        profile_cols = {c["name"] for c in inspector.get_columns("profiles")}
+            if backfill_job_host:
+                rows = conn.execute(text("SELECT id, job_url FROM generated_resumes")).all()
+                if rows:
+                    conn.execute(
+                        text("UPDATE generated_resumes SET job_host = :host WHERE id = :id"),
+                        [{"id": r.id, "host": urlparse(r.job_url).hostname or "job"} for r in rows],
+                    )
+        # The ALTERs succeeded, so no need to inspect again
+        profile_cols |= added_profile_cols
+    for table, fk_names in needs_cascade:
+        with engine.begin() as conn:
+            if engine.dialect.name == "sqlite":
+                # SQLite can't ALTER constraints; copy into a fresh table instead
+                _rebuild_with_cascade(conn, table)
+            else:
+                _replace_fk_with_cascade(conn, table, fk_names)
+    # Drop blobs left without rows (users deleted, or rows deleted mid-render)
+    with engine.begin() as conn:
+        conn.execute(
+            delete(ResumeBlob).where(
+                ~exists().where(GeneratedResume.content_hash == ResumeBlob.content_hash)
+            )
+        )
 
     HAS_PROFILE_ABOUT = "about" in profile_cols
     HAS_PROFILE_GEMINI = "gemini_api_key" in profile_cols
+    _SCHEMA_READY = True
+
+
+def create_app() -> Flask:
+    app = Flask(__name__)
+    app.secret_key = os.getenv("SECRET_KEY", "dev_key")
+
+    # Initialize DB and ensure optional columns exist
+    _ensure_schema()
 
     # Login manager
     login_manager = LoginManager()
@@ -77,8 +221,16 @@ def create_app() -> Flask:
 
     @login_manager.user_loader
     def load_user(user_id: str):
-        sess = SessionLocal()
-        return sess.get(User, int(user_id))
+        sess = g.db
+        # Profile is joined in so routes can use current_user.profile without another query
+        return sess.execute(
+            select(User).options(joinedload(User.profile)).where(User.id == int(user_id))
+        ).scalar_one_or_none()
+
+    # One session per request, shared by the user loader and the views
+    @app.before_request
+    def open_session():
+        g.db = SessionLocal()
 
     # Teardown: remove scoped session
     @app.teardown_appcontext
@@ -121,16 +273,14 @@ def create_app() -> Flask:
         form = SigninForm()
         if request.method == "POST" and form.validate_on_submit():
             email = form.email.data.strip().lower()
-            sess = SessionLocal()
+            sess = g.db
             user = sess.query(User).filter(User.email == email).one_or_none()
             if not user:
                 user = User(email=email, verified=0)
                 sess.add(user)
                 sess.flush()
-            # Generate 6-digit code
-            import random
-
-            code = f"{random.randint(0, 999999):06d}"
+            # Generate 6-digit code (CSPRNG)
+            code = f"{secrets.randbelow(1000000):06d}"
             user.verify_code = code
             user.verify_expiry = datetime.now(timezone.utc) + timedelta(minutes=10)
             sess.commit()
@@ -146,7 +296,7 @@ def create_app() -> Flask:
         if request.method == "POST" and form.validate_on_submit():
             email = form.email.data.strip().lower()
             code = form.code.data.strip()
-            sess = SessionLocal()
+            sess = g.db
             user = sess.query(User).filter(User.email == email).one_or_none()
             now = datetime.now(timezone.utc)
             # Coerce SQLite-returned naive datetimes to UTC-aware for comparison
@@ -165,7 +315,7 @@ def create_app() -> Flask:
                 sess.commit()
                 login_user(user)
                 # ensure profile exists? redirect logic below handles missing
-                prof = sess.query(Profile).filter(Profile.user_id == user.id).one_or_none()
+                prof = user.profile
                 if not prof or not (prof.full_name or "").strip():
                     return redirect(url_for("profile"))
                 return redirect(url_for("tailor"))
@@ -177,8 +327,8 @@ def create_app() -> Flask:
     @app.route("/profile", methods=["GET", "POST"])
     @login_required
     def profile():
-        sess = SessionLocal()
-        prof = sess.query(Profile).filter(Profile.user_id == current_user.id).one_or_none()
+        sess = g.db
+        prof = current_user.profile
         # Build form with custom field mapping
         form = ProfileForm(obj=None)
         if prof:
@@ -229,8 +379,8 @@ def create_app() -> Flask:
     @app.route("/tailor", methods=["GET", "POST"])
     @login_required
     def tailor():
-        sess = SessionLocal()
-        prof = sess.query(Profile).filter(Profile.user_id == current_user.id).one_or_none()
+        sess = g.db
+        prof = current_user.profile
         if not prof or not (prof.full_name or "").strip():
             flash("Please complete your profile (full name is required).")
             return redirect(url_for("profile"))
@@ -255,31 +405,67 @@ def create_app() -> Flask:
                 ),
             }
 
-            try:
-                result = generate_both(profile_dict, url)
-            except Exception as e:
-                flash("Failed to generate resume. Check server dependencies (WeasyPrint).")
-                return render_template("tailor.html", form=form)
-
-            tmpdir = tempfile.mkdtemp(prefix="autotailor_")
-            pdf_path = os.path.join(tmpdir, result["filenames"]["pdf"])  # absolute
-            docx_path = os.path.join(tmpdir, result["filenames"]["docx"])  # absolute
-            with open(pdf_path, "wb") as f:
-                f.write(result["pdf"])
-            with open(docx_path, "wb") as f:
-                f.write(result["docx"])
+            # stdlib json on purpose: the hash must not depend on which encoder is installed.
+            # ENGINE_ID changes with the engine version/backends, retiring older output
+            content_hash = hashlib.sha256(
+                f"{ENGINE_ID}\n".encode()
+                + json.dumps(profile_dict, sort_keys=True).encode()
+                + url.encode()
+            ).hexdigest()
+            job_host = urlparse(url).hostname or "job"
+
+            # Same profile + URL already rendered (or rendering): reuse it, skip the engine
+            in_flight_since = datetime.now(timezone.utc) - RENDER_TIMEOUT
+            cached = (
+                sess.query(GeneratedResume)
+                .filter(
+                    GeneratedResume.user_id == current_user.id,
+                    GeneratedResume.content_hash == content_hash,
+                    or_(
+                        GeneratedResume.status == "ready",
+                        and_(
+                            GeneratedResume.status == "pending",
+                            GeneratedResume.created_at >= in_flight_since,
+                        ),
+                    ),
+                )
+                .order_by(GeneratedResume.created_at.desc())
+                .first()
+            )
+            if cached is not None and cached.status == "pending":
+                # Double submit while the first render is running; follow that one
+                return redirect(url_for("result", id=cached.id))
+            # The new row shares the cached bytes through content_hash; nothing is copied
+            if cached is not None and sess.get(ResumeBlob, content_hash) is not None:
+                # Same bytes, but names carry today's date like a fresh render would
+                filenames = resume_filenames(profile_dict, url)
+                row = GeneratedResume(
+                    user_id=current_user.id,
+                    job_url=url,
+                    job_host=job_host,
+                    pdf_name=filenames["pdf"],
+                    docx_name=filenames["docx"],
+                    coverage_json=cached.coverage_json,
+                    content_hash=content_hash,
+                    status="ready",
+                )
+                sess.add(row)
+                sess.commit()
+                return redirect(url_for("result", id=row.id))
 
+            # Insert a pending row now; the background worker fills in the output
             row = GeneratedResume(
                 user_id=current_user.id,
                 job_url=url,
-                pdf_path=pdf_path,
-                docx_path=docx_path,
-                pdf_name=result["filenames"]["pdf"],
-                docx_name=result["filenames"]["docx"],
-                coverage_json=json.dumps(result.get("coverage", {})),
+                job_host=job_host,
+                pdf_name="",
+                docx_name="",
+                content_hash=content_hash,
+                status="pending",
             )
             sess.add(row)
             sess.commit()
+            enqueue(profile_dict, url, row.id)
             return redirect(url_for("result", id=row.id))
 
         recent = (
@@ -289,20 +475,31 @@ def create_app() -> Flask:
             .limit(5)
             .all()
         )
+        for r in recent:
+            if is_stale(r):
+                # Lost render; show it as failed rather than generating forever
+                mark_failed(r.id)
+                sess.refresh(r)
         del_form = DeleteResumeForm()
         return render_template("tailor.html", form=form, recent=recent, del_form=del_form)
 
     @app.route("/result/<int:id>")
     @login_required
     def result(id: int):
-        sess = SessionLocal()
+        sess = g.db
         row = sess.get(GeneratedResume, id)
         if not row or row.user_id != current_user.id:
             abort(404)
-        coverage = json.loads(row.coverage_json or "{}")
-        host = urlparse(row.job_url).hostname or "job"
+        if is_stale(row):
+            # Render was lost (worker died or server restarted); stop polling
+            mark_failed(row.id)
+            sess.refresh(row)
         del_form = DeleteResumeForm()
-        return render_template("result.html", row=row, coverage=coverage, host=host, del_form=del_form)
+        page = render_template(
+            "result.html", row=row, coverage=row.coverage, host=row.job_host, del_form=del_form
+        )
+        # 202 while the background render is still running; the page auto-refreshes
+        return (page, 202) if row.status == "pending" else page
 
     @app.route("/delete/<int:id>", methods=["POST"])
     @login_required
@@ -310,26 +507,25 @@ def create_app() -> Flask:
         form = DeleteResumeForm()
         if not form.validate_on_submit():
             abort(400)
-        sess = SessionLocal()
+        sess = g.db
         row = sess.get(GeneratedResume, id)
         if not row or row.user_id != current_user.id:
             abort(404)
-        # Attempt to remove files
-        for p in [row.pdf_path, row.docx_path]:
-            try:
-                if p and os.path.exists(p):
-                    os.remove(p)
-            except Exception:
-                pass
-        # Optionally try to remove the temp directory if empty
-        try:
-            d = os.path.dirname(row.pdf_path or "")
-            if d and os.path.isdir(d) and len(os.listdir(d)) == 0:
-                os.rmdir(d)
-        except Exception:
-            pass
-        # Delete DB row
+        # Remove the per-resume temp dir (rows created before blob storage)
+        d = os.path.dirname(row.pdf_path or "")
+        if d and os.path.basename(d).startswith("autotailor_"):
+            shutil.rmtree(d, ignore_errors=True)
+        # Delete DB row, and its blob if no other row shares it
         sess.delete(row)
+        if row.content_hash:
+            sess.flush()
+            sess.execute(
+                delete(ResumeBlob).where(
+                    ResumeBlob.content_hash == row.content_hash,
+                    ~exists().where(GeneratedResume.content_hash == row.content_hash),
+                ),
+                execution_options={"synchronize_session": False},
+            )
         sess.commit()
         flash("Deleted resume")
         return redirect(url_for("tailor"))
@@ -337,14 +533,34 @@ def create_app() -> Flask:
     @app.route("/download/<int:id>/<kind>")
     @login_required
     def download(id: int, kind: str):
-        sess = SessionLocal()
+        sess = g.db
         row = sess.get(GeneratedResume, id)
         if not row or row.user_id != current_user.id:
             abort(404)
+        if row.status != "ready":
+            abort(404)
+        # Shared bytes first, then inline blobs / files of older rows
+        blob = sess.get(ResumeBlob, row.content_hash) if row.content_hash else None
         if kind == "pdf":
-            return send_file(row.pdf_path, as_attachment=True, download_name=row.pdf_name)
+            data = blob.pdf_blob if blob is not None else row.pdf_blob
+            if data is None:
+                return send_file(row.pdf_path, as_attachment=True, download_name=row.pdf_name)
+            return send_file(
+                BytesIO(data),
+                mimetype="application/pdf",
+                as_attachment=True,
+                download_name=row.pdf_name,
+            )
         elif kind == "docx":
-            return send_file(row.docx_path, as_attachment=True, download_name=row.docx_name)
+            data = blob.docx_blob if blob is not None else row.docx_blob
+            if data is None:
+                return send_file(row.docx_path, as_attachment=True, download_name=row.docx_name)
+            return send_file(
+                BytesIO(data),
+                mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                as_attachment=True,
+                download_name=row.docx_name,
+            )
         abort(404)
 
     @app.route("/logout")
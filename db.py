@@ -1,13 +1,14 @@
 """Database helpers for SQLAlchemy engine and session.
 
 Builds engine from DATABASE_URL env or fallback sqlite:///resume.db. Provides
-SessionLocal (scoped_session) and init_db().
+SessionLocal (scoped_session) and init_db(). SQLite connections run in WAL mode
+with synchronous=NORMAL and foreign key enforcement on.
 """
 
 from __future__ import annotations
 
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 
@@ -23,6 +24,21 @@ engine = create_engine(
     _make_engine_url(), echo=os.getenv("SQL_ECHO") == "1", future=True
 )
 
+if engine.dialect.name == "sqlite":
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record) -> None:
+        # WAL lets readers run alongside the writer; NORMAL skips an fsync per commit
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA mmap_size=268435456")
+        # Off by default in SQLite; needed for ON DELETE CASCADE
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.close()
+
+
 # Thread-local scoped session
 SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False))
 
@@ -1,16 +1,19 @@
 """SQLAlchemy models for AutoTailor.
 
-Defines User, Profile, and GeneratedResume.
+Defines User, Profile, GeneratedResume, and ResumeBlob.
 """
 
 from __future__ import annotations
 
+import json
 from datetime import datetime, timezone
 from sqlalchemy import (
     Boolean,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     UniqueConstraint,
@@ -19,6 +22,11 @@ from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from flask_login import UserMixin
 from typing import Optional
 
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is the fallback
+    orjson = None
+
 
 class Base(DeclarativeBase):
     pass
@@ -33,11 +41,19 @@ class User(Base, UserMixin):
     verify_code: Mapped[str | None] = mapped_column(String(6), nullable=True)
     verify_expiry: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
+    # Children are removed by ON DELETE CASCADE; passive_deletes skips loading them first
     profile: Mapped[Optional["Profile"]] = relationship(
-        "Profile", back_populates="user", uselist=False, cascade="all, delete-orphan"
+        "Profile",
+        back_populates="user",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     resumes: Mapped[list["GeneratedResume"]] = relationship(
-        "GeneratedResume", back_populates="user", cascade="all, delete-orphan"
+        "GeneratedResume",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
     def get_id(self) -> str:
@@ -49,7 +65,9 @@ class Profile(Base):
     __table_args__ = (UniqueConstraint("user_id", name="uq_profile_user"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
 
     full_name: Mapped[str] = mapped_column(String(255), nullable=False)
     city: Mapped[str | None] = mapped_column(String(255), nullable=True)
@@ -65,18 +83,72 @@ class Profile(Base):
 
 class GeneratedResume(Base):
     __tablename__ = "generated_resumes"
+    __table_args__ = (
+        Index("ix_genres_user_hash", "user_id", "content_hash"),
+        # Finds other rows sharing a ResumeBlob, across users
+        Index("ix_genres_hash", "content_hash"),
+        # Serves the per-user "recent resumes" query (SQLite scans it backwards for DESC)
+        Index("ix_genres_user_created", "user_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
     job_url: Mapped[str] = mapped_column(Text, nullable=False)
+    # Parsed once at insert so pages don't re-run urlparse on every view
+    job_host: Mapped[str | None] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
     )
 
-    pdf_path: Mapped[str] = mapped_column(Text, nullable=False)
-    docx_path: Mapped[str] = mapped_column(Text, nullable=False)
+    # Legacy on-disk copies; empty for rows whose bytes live in the blob columns
+    pdf_path: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    docx_path: Mapped[str] = mapped_column(Text, nullable=False, default="")
     pdf_name: Mapped[str] = mapped_column(Text, nullable=False)
     docx_name: Mapped[str] = mapped_column(Text, nullable=False)
+    # Inline bytes of rows rendered before ResumeBlob; new rows leave these NULL.
+    # Deferred so listing resumes doesn't pull file bytes
+    pdf_blob: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
+    docx_blob: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
     coverage_json: Mapped[str] = mapped_column(Text, nullable=True)
+    # sha256 of engine ID + canonical profile JSON + job URL; identical inputs
+    # reuse output, and the bytes live once in ResumeBlob under this key
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # pending -> ready | failed; set by the background renderer (tasks.py)
+    status: Mapped[str] = mapped_column(
+        String(16), default="ready", server_default="ready", nullable=False
+    )
 
     user: Mapped[User] = relationship("User", back_populates="resumes")
+
+    @property
+    def coverage(self) -> dict:
+        """Decoded coverage_json ({} when unset)."""
+        if not self.coverage_json:
+            return {}
+        if orjson is not None:
+            return orjson.loads(self.coverage_json)
+        return json.loads(self.coverage_json)
+
+    @coverage.setter
+    def coverage(self, value: dict) -> None:
+        if orjson is not None:
+            self.coverage_json = orjson.dumps(value).decode()
+        else:
+            self.coverage_json = json.dumps(value)
+
+
+class ResumeBlob(Base):
+    """Rendered PDF/DOCX bytes, stored once per content_hash.
+
+    GeneratedResume rows with the same content_hash share one ResumeBlob; the
+    blob is deleted along with the last row that references it.
+    """
+
+    __tablename__ = "resume_blobs"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Deferred so a download only loads the format it serves
+    pdf_blob: Mapped[bytes] = mapped_column(LargeBinary, nullable=False, deferred=True)
+    docx_blob: Mapped[bytes] = mapped_column(LargeBinary, nullable=False, deferred=True)
@@ -0,0 +1,165 @@
+"""Background resume rendering.
+
+Runs generate_both() in a process pool so the request thread only inserts a
+pending GeneratedResume row and returns. The worker stores the PDF/DOCX bytes in
+ResumeBlob (once per content_hash) and flips the row's status to "ready" (or
+"failed"). If the worker process dies, or a row stays pending past
+RENDER_TIMEOUT seconds (e.g. across a server restart), the row is marked
+"failed" instead.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from db import engine
+from models import GeneratedResume, ResumeBlob
+from adapters.resume_engine import generate_both
+
+logger = logging.getLogger(__name__)
+
+# Pending rows older than this are treated as lost renders
+RENDER_TIMEOUT = timedelta(seconds=int(os.getenv("RENDER_TIMEOUT", "300")))
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _init_worker() -> None:
+    # Belt and braces: never reuse pooled DB connections inherited from a parent
+    engine.dispose(close=False)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the process pool, creating it on first use (one per web worker)."""
+    global _executor
+    if _executor is None:
+        workers = int(os.getenv("RENDER_WORKERS", "0")) or os.cpu_count() or 1
+        # Workers start from a clean forkserver/spawn process, not a fork of a
+        # multi-threaded web worker (which would copy its sessions and connections)
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(method),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def render_resume(profile: dict, url: str, row_id: int) -> None:
+    """Generate PDF/DOCX for a pending row and store the result on it."""
+    # A plain Session, not the thread-local SessionLocal registry
+    with Session(engine) as sess:
+        row = sess.get(GeneratedResume, row_id)
+        if row is None:
+            # Deleted before the worker picked it up
+            return
+        try:
+            result = generate_both(profile, url)
+        except Exception:
+            logger.exception("Rendering resume %s failed", row_id)
+            row.status = "failed"
+        else:
+            if row.content_hash is None:
+                row.pdf_blob = result["pdf"]
+                row.docx_blob = result["docx"]
+            else:
+                _save_blob(row.content_hash, result["pdf"], result["docx"])
+            row.pdf_name = result["filenames"]["pdf"]
+            row.docx_name = result["filenames"]["docx"]
+            row.coverage = result.get("coverage", {})
+            row.status = "ready"
+        try:
+            sess.commit()
+        except StaleDataError:
+            # Deleted while rendering; the output has nowhere to go (an unreferenced
+            # ResumeBlob is swept on the next startup)
+            sess.rollback()
+            logger.info("Resume %s was deleted during rendering; output discarded", row_id)
+
+
+def _save_blob(content_hash: str, pdf: bytes, docx: bytes) -> None:
+    """Store rendered bytes under content_hash unless they are already there."""
+    with Session(engine) as sess:
+        if sess.get(ResumeBlob, content_hash) is not None:
+            return
+        sess.add(ResumeBlob(content_hash=content_hash, pdf_blob=pdf, docx_blob=docx))
+        try:
+            sess.commit()
+        except IntegrityError:
+            # Another worker stored the same hash first; its bytes are the same
+            sess.rollback()
+
+
+def mark_failed(row_id: int) -> None:
+    """Flip row_id from pending to failed.
+
+    Uses its own Session (not the scoped one), so it is safe to call from a
+    request thread or from a Future callback thread.
+    """
+    with Session(engine) as sess:
+        sess.execute(
+            update(GeneratedResume)
+            .where(GeneratedResume.id == row_id, GeneratedResume.status == "pending")
+            .values(status="failed")
+        )
+        sess.commit()
+
+
+def is_stale(row: GeneratedResume) -> bool:
+    """True if row is still pending after RENDER_TIMEOUT."""
+    if row.status != "pending":
+        return False
+    created = row.created_at
+    # Coerce SQLite-returned naive datetimes to UTC-aware for comparison
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - created > RENDER_TIMEOUT
+
+
+def _reset_executor(broken: ProcessPoolExecutor) -> None:
+    # A dead worker breaks the whole pool; drop it so the next enqueue() starts fresh
+    global _executor
+    if _executor is broken:
+        _executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def enqueue(profile: dict, url: str, row_id: int) -> Future | None:
+    """Schedule render_resume() for row_id on the process pool.
+
+    If the pool can't accept the job, the row is marked failed and None is
+    returned. Jobs whose worker process dies are marked failed as well.
+    """
+    executor = get_executor()
+    try:
+        future = executor.submit(render_resume, profile, url, row_id)
+    except Exception:
+        logger.exception("Could not schedule render for resume %s", row_id)
+        _reset_executor(executor)
+        mark_failed(row_id)
+        return None
+
+    def _on_done(f: Future) -> None:
+        if f.cancelled():
+            mark_failed(row_id)
+            return
+        exc = f.exception()
+        if exc is None:
+            return
+        logger.error("Render for resume %s did not complete", row_id, exc_info=exc)
+        if isinstance(exc, BrokenProcessPool):
+            _reset_executor(executor)
+        mark_failed(row_id)
+
+    future.add_done_callback(_on_done)
+    return future